@@ -1,7 +1,13 @@
+import re
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from pandas.api.types import union_categoricals
 from io import BytesIO
 from datetime import date, timedelta
+from data_loader import load_sheets, source_version, squash_name
 
 st.set_page_config(page_title="SMC-Madhusudan Daily Working Dashboard", layout="wide")
 
@@ -49,50 +55,270 @@ tab1, tab2 = st.tabs(["📊 Daily Summary", "🏪 Outlet Wise Report"])
 # ---------------------
 # Helpers
 # ---------------------
-def normalize_columns(df):
-    df = df.copy()
-    df.columns = (
-        df.columns.str.strip()
-        .str.replace(r"[_\s]+", " ", regex=True)
-        .str.title()
-    )
-    return df
+@st.cache_data(show_spinner=False)
+def resolve_filter_cols(columns):
+    # Match filters to columns ignoring case/spaces/underscores
+    # ("Primary Category" -> "Primarycategory"); None when absent.
+    norm_cols = {squash_name(c): c for c in columns}
+    return [(f, norm_cols.get(key)) for f, key in norm_filters]
+
+def filter_options(series):
+    # Categorical columns already carry their sorted distinct values.
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.remove_unused_categories().cat.categories.tolist()
+    # Vectorized argsort (numpy/Arrow) instead of sorted() over Python objects
+    vals = series.dropna().unique()
+    return vals[vals.argsort()].tolist()
+
+@st.cache_data(show_spinner=False, max_entries=500)
+def cached_filter_options(col, data_key, filter_key, _df, _mask):
+    # _df/_mask are not hashed: the options are fully determined by the
+    # dataset version plus the filter selections made before this column.
+    if _mask.all() and isinstance(_df[col].dtype, pd.CategoricalDtype):
+        return _df[col].cat.categories.tolist()  # nothing filtered yet: O(k)
+    return filter_options(_df.loc[_mask, col])
+
+def compute_view(view_key, df_obj, mask):
+    # view_key = (dataset version, filter selections, visible columns).
+    # Row mask and column projection in one .loc: only visible columns are gathered.
+    return df_obj.loc[mask, list(view_key[2])]
+
+def preview_frame(df_obj, n):
+    # Only n rows go over the websocket; short date strings are a much
+    # smaller Arrow payload than full timestamps.
+    preview = df_obj.head(n)
+    dt_cols = preview.select_dtypes(include=["datetime64", "datetimetz"]).columns
+    if len(dt_cols):
+        preview = preview.assign(**{c: preview[c].dt.strftime("%Y-%m-%d") for c in dt_cols})
+    return preview
+
+def to_csv_bytes(df_obj):
+    # Arrow writes UTF-8 straight from column buffers (no big Python str)
+    try:
+        table = pa.Table.from_pandas(df_obj, preserve_index=False)
+    except pa.ArrowException:
+        # pandas already writes all-midnight datetime columns as plain dates
+        return df_obj.to_csv(index=False).encode("utf-8")
+    # Dates are kept as midnight timestamps; write those as plain dates.
+    # Columns that carry a time of day stay full timestamps.
+    for c in df_obj.select_dtypes(include="datetime64").columns:
+        vals = df_obj[c].dropna()
+        if (vals == vals.dt.normalize()).all():
+            i = table.schema.get_field_index(c)
+            table = table.set_column(i, c, table.column(i).cast(pa.date32()))
+    buf = pa.BufferOutputStream()
+    pa_csv.write_csv(table, buf)
+    return buf.getvalue().to_pybytes()
+
+def to_excel_bytes(df_obj):
+    out = BytesIO()
+    with pd.ExcelWriter(out, engine="xlsxwriter", datetime_format="yyyy-mm-dd") as writer:
+        df_obj.to_excel(writer, index=False)
+    return out.getvalue()
+
+# Only the file bytes are cached (not the filtered frame), for a bounded
+# number of recent selections per process.
+@st.cache_data(show_spinner=False, max_entries=16)
+def cached_csv_bytes(view_key, _df, _mask):
+    return to_csv_bytes(compute_view(view_key, _df, _mask))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cached_excel_bytes(view_key, _df, _mask):
+    return to_excel_bytes(compute_view(view_key, _df, _mask))
+
+# UTC offset after a clock time ("10:00:00+05:30", "10:00Z"), with any
+# fractional seconds before it.
+_TZ_SUFFIX_RE = re.compile(r"(?<=:\d\d)(?:\.\d+)?\s*(?:Z|[+-]\d\d(?::?\d\d)?)$")
+
+DATE_FORMATS = (
+    "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%m/%d/%Y",
+    "%d.%m.%Y", "%Y/%m/%d", "%d-%b-%Y", "%d %b %Y",
+)
 
 def robust_parse_date_col(series):
-    s = series.copy()
-    parsed = pd.to_datetime(s, errors="coerce")
-    return parsed.dt.date
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.normalize()
+    # ISO 8601 has a C fast path; "mixed" (day first) and then the explicit
+    # formats only see the rows that every earlier attempt left as NaT.
+    s_str = series.astype("string").str.strip()
+    # Offsets are dropped so each value keeps its own wall-clock date (what
+    # .dt.date gave); a tz-aware or mixed-offset parse can't fill this column.
+    if s_str.str.contains(_TZ_SUFFIX_RE).any():
+        s_str = s_str.str.replace(_TZ_SUFFIX_RE, "", regex=True)
+    # Microsecond resolution (to_datetime's own) keeps sentinels like 9999-12-31.
+    parsed = pd.to_datetime(s_str, format="ISO8601", errors="coerce").astype("datetime64[us]")
+    # Excel day serials (~1954-2119), converted in one vectorized call.
+    s_num = pd.to_numeric(series, errors="coerce")
+    serial = s_num.between(20000, 80000).to_numpy()
+    if serial.any():
+        nums = s_num[serial].to_numpy(dtype="float64")
+        parsed[serial] = pd.to_datetime(nums, unit="D", origin="1899-12-30", errors="coerce")
+    mask = (s_str.notna() & parsed.isna()).to_numpy(copy=True)
+    if mask.any():
+        # Non-ISO text usually sticks to one format: find it on a small
+        # sample and run it over all remaining rows before anything slower.
+        sample = s_str[mask].head(256)
+        hits = {fmt: pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum() for fmt in DATE_FORMATS}
+        best = max(hits, key=hits.get)
+        if hits[best]:
+            parsed[mask] = pd.to_datetime(s_str[mask], format=best, errors="coerce")
+            mask &= parsed.isna().to_numpy()
+    if mask.any():
+        parsed[mask] = pd.to_datetime(s_str[mask], format="mixed", dayfirst=True, errors="coerce")
+        mask &= parsed.isna().to_numpy()
+    for fmt in DATE_FORMATS:
+        if not mask.any():
+            break
+        parsed[mask] = pd.to_datetime(s_str[mask], format=fmt, errors="coerce")
+        mask &= parsed.isna().to_numpy()
+    # Stay datetime64 (int64 compares/hashes); format only for display.
+    return parsed.dt.normalize()
+
+def categories_as_text(s):
+    # Categorical -> text categories. Whole-number floats (numeric IDs in a
+    # column with blanks) are written without ".0", so 1.0 matches "1".
+    cats = s.cat.categories
+    if pd.api.types.is_float_dtype(cats) and (cats == cats.round()).all():
+        cats = cats.astype("int64")
+    return s.cat.rename_categories(cats.astype(str)).astype("string").astype("category")
+
+def shared_categories(*series):
+    # One CategoricalDtype for columns that are joined or coalesced together.
+    # An all-blank column (read as float64 NaN) adds no categories; if the
+    # filled sides still disagree (numeric IDs vs text) values compare as text.
+    series = [s.astype("category") for s in series]
+    if len({s.cat.categories.dtype for s in series if len(s.cat.categories)}) > 1:
+        series = [categories_as_text(s) for s in series]
+    filled = [s for s in series if len(s.cat.categories)]
+    if not filled:
+        return series
+    dtype = pd.CategoricalDtype(union_categoricals(filled, sort_categories=True).categories)
+    return [s.astype(dtype) for s in series]
+
+def coalesce(primary, fallback):
+    # primary where present, else fallback; categoricals get a shared dtype
+    # first so fallback values are valid categories.
+    if isinstance(primary.dtype, pd.CategoricalDtype) or isinstance(fallback.dtype, pd.CategoricalDtype):
+        primary, fallback = shared_categories(primary, fallback)
+    return primary.where(primary.notna(), fallback)
+
+def merge_secondary(df_summary, df_secondary, join_keys):
+    # Identical key dtypes on both sides keep pandas on the direct hash-join
+    # path (no key upcast/copy), e.g. datetime64[us] vs datetime64[ns].
+    mismatched = {k: df_summary[k].dtype for k in join_keys if df_secondary[k].dtype != df_summary[k].dtype}
+    if mismatched:
+        df_secondary = df_secondary.astype(mismatched)
+
+    # Columns both sheets carry: Summary wins. Secondary's copy is dropped
+    # before the join where Summary is complete, otherwise kept only to fill
+    # Summary's gaps, so the result has one plain-named column for each.
+    overlap = [c for c in df_secondary.columns if c in df_summary.columns and c not in join_keys]
+    fill_cols = [c for c in overlap if df_summary[c].isna().any()]
+    df_secondary = df_secondary.drop(columns=[c for c in overlap if c not in fill_cols])
+    df_secondary = df_secondary.rename(columns={c: f"{c}_Sec" for c in fill_cols})
+
+    if not df_secondary.duplicated(subset=join_keys).any():
+        # One Secondary row per key: a keyed lookup replaces the full merge.
+        right = df_secondary.set_index(join_keys).reindex(df_summary.set_index(join_keys).index)
+        df = pd.concat([df_summary, right.set_axis(df_summary.index)], axis=1)
+    else:
+        # Summary normally has one row per user/day, Secondary one row per
+        # order line. Repeated Summary keys (two people with the same name)
+        # are merged as-is rather than rejected.
+        summary_unique = not df_summary.duplicated(subset=join_keys).any()
+        df = pd.merge(df_summary, df_secondary, on=join_keys, how="left", sort=False,
+                      validate="one_to_many" if summary_unique else None)
+
+    for c in fill_cols:
+        df[c] = coalesce(df[c], df.pop(f"{c}_Sec"))
+    return df
+
+# ---------------------
+# Column vocabulary
+# ---------------------
+required_filters = [
+    "Region","User","L4Position User","L3Position User","L2Position User",
+    "Reporting Manager","Primary Category"
+]
+
+# curated list (Summary + Secondary)
+curated_cols = [
+    "Order Date","L4Position User","L3Position User","L2Position User","Region",
+    "Reporting Manager","User","Selected Jw User","Type","Reason",
+    "Tc","Pc","Ovc","First Call","Last Call","Total Retail Time(Hh:Mm)",
+    "Ghee","Dw Primary Packs","Dw Consu","Dw Bulk","36 No","Smp","Gjm",
+    "Cream","Uht Milk","Flavored Milk",
+    "Distributor","Territory","Beat"
+]
+
+# (label, squashed name) pairs, normalized once at import
+norm_filters = [(f, squash_name(f)) for f in required_filters]
+
+# Only these columns are read from the workbooks
+needed_cols = curated_cols + required_filters + ["User", "Order Date", "Date"]
 
 # ---------------------
 # Load data
 # ---------------------
-@st.cache_data
-def load_data():
-    df_summary = pd.read_excel("Summary.xlsx", engine="openpyxl")
-    df_secondary = pd.read_excel("Secondary.xlsx", engine="openpyxl")
-    return normalize_columns(df_summary), normalize_columns(df_secondary)
-
-df_summary, df_secondary = load_data()
-
-# Rename Date -> Order Date
-if "Date" in df_summary.columns and "Order Date" not in df_summary.columns:
-    df_summary = df_summary.rename(columns={"Date": "Order Date"})
-if "Date" in df_secondary.columns and "Order Date" not in df_secondary.columns:
-    df_secondary = df_secondary.rename(columns={"Date": "Order Date"})
-
-# Parse dates
-if "Order Date" in df_summary.columns:
-    df_summary["Order Date"] = robust_parse_date_col(df_summary["Order Date"])
-if "Order Date" in df_secondary.columns:
-    df_secondary["Order Date"] = robust_parse_date_col(df_secondary["Order Date"])
-
-# Merge
-join_keys = ["User", "Order Date"] if "Order Date" in df_secondary.columns else ["User"]
-df = pd.merge(df_summary, df_secondary, on=join_keys, how="left", suffixes=("_Sum", "_Sec"))
-
-# Drop unwanted cols from table
-remove_cols = ["Outlet Name", "Address", "Market", "Product"]
-df = df.drop(columns=[c for c in remove_cols if c in df.columns], errors="ignore")
+# Everything up to the merged, typed frame is cached; widget reruns only
+# filter and render. Only the current workbook version is kept in memory.
+@st.cache_data(show_spinner=False, max_entries=1)
+def build_dataset(data_key):
+    df_summary, df_secondary = load_sheets(needed_cols)
+
+    # Rename Date -> Order Date
+    if "Date" in df_summary.columns and "Order Date" not in df_summary.columns:
+        df_summary = df_summary.rename(columns={"Date": "Order Date"})
+    if "Date" in df_secondary.columns and "Order Date" not in df_secondary.columns:
+        df_secondary = df_secondary.rename(columns={"Date": "Order Date"})
+
+    # Parse dates
+    if "Order Date" in df_summary.columns:
+        df_summary["Order Date"] = robust_parse_date_col(df_summary["Order Date"])
+    if "Order Date" in df_secondary.columns:
+        df_secondary["Order Date"] = robust_parse_date_col(df_secondary["Order Date"])
+
+    # Low-cardinality text columns -> category before the merge (integer
+    # codes for the join, cheaper unique/isin on filters afterwards)
+    low_card_cols = [
+        "Region","Territory","L4Position User","L3Position User","L2Position User",
+        "Reporting Manager","Primary Category","Primarycategory","Distributor","Beat","Market","Product"
+    ]
+    for frame in (df_summary, df_secondary):
+        for c in low_card_cols:
+            if c in frame.columns and not isinstance(frame[c].dtype, pd.CategoricalDtype):
+                frame[c] = frame[c].astype("category")
+
+    # The User join key needs one shared dtype on both sides, otherwise the
+    # merge falls back to comparing strings.
+    df_summary["User"], df_secondary["User"] = shared_categories(df_summary["User"], df_secondary["User"])
+
+    # Merge
+    join_keys = ["User", "Order Date"] if "Order Date" in df_secondary.columns else ["User"]
+    df = merge_secondary(df_summary, df_secondary, join_keys)
+
+    # Drop unwanted cols from table
+    remove_cols = ["Outlet Name", "Address", "Market", "Product"]
+    df = df.drop(columns=[c for c in remove_cols if c in df.columns], errors="ignore")
+
+    # Call/pack counts fit comfortably in int32; halves their footprint.
+    count_cols = [
+        "Tc","Pc","Ovc","Ghee","Dw Primary Packs","Dw Consu","Dw Bulk","36 No","Smp","Gjm",
+        "Cream","Uht Milk","Flavored Milk"
+    ]
+    for c in count_cols:
+        if c in df.columns and pd.api.types.is_integer_dtype(df[c]):
+            df[c] = df[c].astype("int32")
+
+    # Categories were built before the left join, so they still list values
+    # seen only in dropped Secondary rows; filter options must not offer them.
+    cat_cols = df.select_dtypes(include="category").columns
+    df[cat_cols] = df[cat_cols].apply(lambda c: c.cat.remove_unused_categories())
+
+    return df
+
+data_key = source_version()
+df = build_dataset(data_key)
 
 # ---------------------
 # DAILY SUMMARY TAB
@@ -104,7 +330,7 @@ with tab1:
     st.subheader("📊 Daily Summary Report")
 
     # ---- Date Filter (combined) ----
-    min_date, max_date = df["Order Date"].min(), df["Order Date"].max()
+    min_date, max_date = df["Order Date"].min().date(), df["Order Date"].max().date()
 
     col1, col2 = st.columns([2, 1])
     with col1:
@@ -112,75 +338,67 @@ with tab1:
     with col2:
         date_group = st.selectbox("Date Group", ["All", "Last 7 Days", "Last 15 Days"])
 
-    df_filtered = df.copy()
+    # Every filter ANDs into one mask; the frame is sliced once at the end.
+    mask = np.ones(len(df), dtype=bool)
+    order_dates = df["Order Date"]
+    filter_key = [date_mode, date_group, date.today()]
 
     if date_mode == "Single Date":
         single_date = st.date_input("Pick a Date", value=max_date, min_value=min_date, max_value=max_date)
-        df_filtered = df_filtered[df_filtered["Order Date"] == single_date]
+        mask &= (order_dates == pd.Timestamp(single_date)).to_numpy()
+        filter_key.append(single_date)
 
     elif date_mode == "Date Range":
         date_range = st.date_input("Pick a Date Range", value=(min_date, max_date),
                                    min_value=min_date, max_value=max_date)
         if isinstance(date_range, tuple) and len(date_range) == 2:
-            df_filtered = df_filtered[(df_filtered["Order Date"] >= date_range[0]) & (df_filtered["Order Date"] <= date_range[1])]
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+            mask &= ((order_dates >= start) & (order_dates <= end)).to_numpy()
+            filter_key.append(tuple(date_range))
 
     # ---- Date Group still applies after above ----
     if date_group == "Last 7 Days":
-        df_filtered = df_filtered[df_filtered["Order Date"] >= date.today() - timedelta(days=7)]
+        mask &= (order_dates >= pd.Timestamp(date.today() - timedelta(days=7))).to_numpy()
     elif date_group == "Last 15 Days":
-        df_filtered = df_filtered[df_filtered["Order Date"] >= date.today() - timedelta(days=15)]
+        mask &= (order_dates >= pd.Timestamp(date.today() - timedelta(days=15))).to_numpy()
 
     # ---- Other Filters (Smart Filtering) ----
-    required_filters = [
-        "Region","User","L4Position User","L3Position User","L2Position User",
-        "Reporting Manager","Primary Category"
-    ]
-
-    for f in required_filters:
-        if f in df_filtered.columns:
-            vals = sorted(df_filtered[f].dropna().unique().tolist())
+    for f, col in resolve_filter_cols(tuple(df.columns)):
+        if col is not None:
+            vals = cached_filter_options(col, data_key, tuple(filter_key), df, mask)
             vals = ["All"] + vals
             sel = st.multiselect(f, vals, default="All", key=f"f_{f}")
             if "All" not in sel:
-                df_filtered = df_filtered[df_filtered[f].isin(sel)]
+                mask &= df[col].isin(sel).to_numpy()
+                filter_key.append((col, tuple(sel)))
 
     # ---- Column Selection ----
-    # curated list (Summary + Secondary)
-curated_cols = [
-    "Order Date","L4Position User","L3Position User","L2Position User","Region",
-    "Reporting Manager","User","Selected Jw User","Type","Reason",
-    "Tc","Pc","Ovc","First Call","Last Call","Total Retail Time(Hh:Mm)",
-    "Ghee","Dw Primary Packs","Dw Consu","Dw Bulk","36 No","Smp","Gjm",
-    "Cream","Uht Milk","Flavored Milk",
-    "Distributor","Territory","Beat"
-]
-
-# keep only those present in df_filtered
-allowed_cols = [c for c in curated_cols if c in df_filtered.columns]
+    # keep only those present in df
+    allowed_cols = [c for c in curated_cols if c in df.columns]
 
-cols_available = ["All"] + allowed_cols
-selected_cols = st.multiselect("Columns Wants in Table", cols_available, default="All")
+    cols_available = ["All"] + allowed_cols
+    selected_cols = st.multiselect("Columns Wants in Table", cols_available, default="All")
 
-if "All" in selected_cols or not selected_cols:
-    final_df = df_filtered[allowed_cols]
-else:
-    final_df = df_filtered[selected_cols]
+    if "All" in selected_cols or not selected_cols:
+        final_cols = allowed_cols
+    else:
+        final_cols = selected_cols
 
+    # The same filters + columns always give the same view and export bytes.
+    view_key = (data_key, tuple(filter_key), tuple(final_cols))
 
     # ---- Results ----
+    # The table only needs the first 200 matching rows; gather just those.
     st.markdown("### Results Table (Top 200 Rows)")
-    st.dataframe(final_df.head(200), width="stretch")
+    head_rows = np.flatnonzero(mask)[:200]
+    st.dataframe(preview_frame(df.iloc[head_rows][final_cols], 200), width="stretch")
 
     # ---- Export ----
-    def to_csv_bytes(df_obj): return df_obj.to_csv(index=False).encode("utf-8")
-    def to_excel_bytes(df_obj):
-        out = BytesIO()
-        with pd.ExcelWriter(out, engine="openpyxl") as writer:
-            df_obj.to_excel(writer, index=False)
-        return out.getvalue()
-
-    st.download_button("Download CSV", to_csv_bytes(final_df), "filtered_export.csv", "text/csv")
-    st.download_button("Download Excel", to_excel_bytes(final_df),
+    # The full filtered frame and its file bytes are only built when a
+    # download is actually clicked.
+    st.download_button("Download CSV", lambda: cached_csv_bytes(view_key, df, mask),
+                       "filtered_export.csv", "text/csv")
+    st.download_button("Download Excel", lambda: cached_excel_bytes(view_key, df, mask),
                        "filtered_export.xlsx",
                        "application/vnd.openxmlformats-officedocument-spreadsheetml.sheet")
 
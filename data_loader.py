@@ -0,0 +1,116 @@
+import glob
+import hashlib
+import os
+import re
+import streamlit as st
+import pandas as pd
+import pyarrow.parquet as pq_lib
+from pandas.io.parsers import TextParser
+
+try:
+    import python_calamine  # noqa: F401  (engine used by pd.read_excel)
+    HAVE_CALAMINE = True
+except ImportError:
+    HAVE_CALAMINE = False
+
+SOURCE_FILES = ("Summary.xlsx", "Secondary.xlsx")
+CACHE_DIR = ".cache"
+
+_COL_RE = re.compile(r"[_\s]+")
+
+# ---------------------
+# Helpers
+# ---------------------
+def normalize_columns(df):
+    df.columns = [_COL_RE.sub(" ", str(c).strip()).title() for c in df.columns]
+    return df
+
+def squash_name(name):
+    # "Primary Category", " primary_category " -> "primarycategory"
+    return _COL_RE.sub("", str(name)).lower()
+
+def _file_version(path):
+    # (mtime_ns, size): one identity for the snapshot name and every cache key
+    info = os.stat(path)
+    return info.st_mtime_ns, info.st_size
+
+def _snapshot_path(path):
+    # One snapshot per file version: (path, mtime, size) -> short hash.
+    mtime_ns, size = _file_version(path)
+    digest = hashlib.sha1(f"{path}|{mtime_ns}|{size}".encode()).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    return os.path.join(CACHE_DIR, f"{stem}_{digest}.parquet")
+
+def _read_workbook(path):
+    # First sheet, first row as header (same as pd.read_excel defaults).
+    if HAVE_CALAMINE:
+        return pd.read_excel(path, engine="calamine")
+    # openpyxl fallback: read-only mode streams cell values without
+    # building the styled workbook in memory.
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = list(wb.worksheets[0].iter_rows(values_only=True))
+    finally:
+        wb.close()
+    # The same row parser read_excel uses: header naming, blank -> NaN and
+    # numeric/date inference match the calamine path.
+    return TextParser(rows, header=0).read()
+
+def _load_cached(path, keep=None):
+    # Parse the workbook once per version and keep a Parquet snapshot;
+    # later cold starts read the snapshot until the .xlsx changes.
+    # `keep` (squashed names) limits which columns are materialized.
+    pq = _snapshot_path(path)
+    if os.path.exists(pq):
+        try:
+            cols = None
+            if keep is not None:
+                cols = [c for c in pq_lib.read_schema(pq).names if squash_name(c) in keep]
+            return pd.read_parquet(pq, engine="pyarrow", columns=cols)
+        except (OSError, ValueError):
+            # Unreadable snapshot (e.g. truncated): drop it and re-parse.
+            try:
+                os.remove(pq)
+            except OSError:
+                pass
+    df = _read_workbook(path)
+    tmp = f"{pq}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        prefix = pq.rsplit("_", 1)[0]
+        for old in glob.glob(prefix + "_" + "[0-9a-f]" * 12 + ".parquet"):
+            os.remove(old)  # snapshots of earlier versions of this file
+        # Write aside and rename: a killed process never leaves a partial
+        # file under the name later starts trust.
+        df.to_parquet(tmp, engine="pyarrow", compression="zstd")
+        os.replace(tmp, pq)
+    except (OSError, ValueError, TypeError):
+        # read-only checkout or mixed-type column: just skip the snapshot
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if keep is not None:
+        df = df[[c for c in df.columns if squash_name(c) in keep]]
+    return df
+
+def source_version():
+    # (mtime_ns, size) of the source workbooks, the same identity the
+    # snapshots use; keys caches derived from the dataset
+    return tuple(_file_version(p) for p in SOURCE_FILES)
+
+# ---------------------
+# Load data
+# ---------------------
+# Only the current workbook version is kept; an edited file replaces it.
+@st.cache_data(show_spinner=False, max_entries=1)
+def _load_sheets(data_key, keep):
+    df_summary, df_secondary = (_load_cached(p, keep) for p in SOURCE_FILES)
+    return normalize_columns(df_summary), normalize_columns(df_secondary)
+
+def load_sheets(columns=None):
+    # Shared entry point for every page; the cache entry follows the file
+    # mtimes, so an edited workbook is picked up without a restart.
+    # `columns` restricts the load to the names a page actually uses
+    # (matched ignoring case, spaces and underscores).
+    keep = None if columns is None else frozenset(squash_name(c) for c in columns)
+    return _load_sheets(source_version(), keep)